@@ -1,19 +1,42 @@
+import asyncio
+import hashlib
+import random
+from collections.abc import Hashable
+from typing import cast
+
+import numpy as np
 import structlog
 from llm_taxi.factory import embedding
 
+from hanashi.utils.cache import LRUCache
 from hanashi.utils.logging import log_time
+from hanashi.utils.misc import chunk
 
 logger = structlog.get_logger()
 
 
+def normalize_vectors(vectors: list[list[float]]) -> list[list[float]]:
+    array = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(array, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return (array / norms).tolist()
+
+
 class Embedding:
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         *,
         model: str,
         api_key: str | None = None,
         base_url: str | None = None,
         call_kwargs: dict | None = None,
+        cache_size: int = 0,
+        cache_ttl: float | None = None,
+        batch_size: int = 128,
+        max_concurrency: int = 4,
+        jitter: float = 0.0,
+        normalize: bool = False,
         **client_kwargs,
     ) -> None:
         self.model = model
@@ -24,6 +47,54 @@ class Embedding:
             call_kwargs=call_kwargs,
             **client_kwargs,
         )
+        # Vectors are cached as tuples, so callers can't modify cached entries.
+        self.cache: LRUCache[tuple[float, ...]] = LRUCache(
+            maxsize=cache_size,
+            ttl=cache_ttl,
+        )
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        # Unit length vectors let cosine similarity be computed as a dot product.
+        self.normalize = normalize
+
+    def _cache_key(self, text: str, kwargs: dict) -> bytes:
+        key = hashlib.blake2b(digest_size=16)
+        key.update(self.model.encode())
+        key.update(b"\x00")
+        key.update(repr(sorted(kwargs.items())).encode())
+        key.update(b"\x00")
+        key.update(text.encode())
+
+        return key.digest()
+
+    async def _embed_batches(self, texts: list[str], **kwargs) -> list[list[float]]:
+        if len(texts) <= self.batch_size:
+            return await self.client.embed_texts(texts=texts, **kwargs)
+
+        # Batch texts of similar length together to keep request sizes even.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = list(chunk(order, self.batch_size))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _embed_batch(batch: tuple[int, ...]) -> list[list[float]]:
+            async with semaphore:
+                if self.jitter:
+                    await asyncio.sleep(random.random() * self.jitter)  # noqa: S311
+
+                return await self.client.embed_texts(
+                    texts=[texts[i] for i in batch],
+                    **kwargs,
+                )
+
+        batch_vectors = await asyncio.gather(*map(_embed_batch, batches))
+
+        vectors: list[list[float]] = [[] for _ in texts]
+        for batch, batch_vector in zip(batches, batch_vectors, strict=True):
+            for i, vector in zip(batch, batch_vector, strict=True):
+                vectors[i] = vector
+
+        return vectors
 
     @log_time(
         args=lambda args: {
@@ -31,9 +102,22 @@ class Embedding:
         },
     )
     async def embed_text(self, text: str, **kwargs) -> list[float]:
+        use_cache = self.cache.maxsize > 0
+        if use_cache:
+            key = self._cache_key(text, kwargs)
+            if (cached := self.cache.get(key)) is not None:
+                logger.debug("Embedding cache hit", text=text, model=self.model)
+                return list(cached)
+
         logger.debug("Embed text", text=text, model=self.model)
 
-        return await self.client.embed_text(text=text, **kwargs)
+        vector = await self.client.embed_text(text=text, **kwargs)
+        if self.normalize:
+            vector = normalize_vectors([vector])[0]
+        if use_cache:
+            self.cache.put(key, tuple(vector))
+
+        return vector
 
     @log_time(
         args=lambda args: {
@@ -41,6 +125,50 @@ class Embedding:
         },
     )
     async def embed_texts(self, texts: list[str], **kwargs) -> list[list[float]]:
-        logger.debug("Embed texts", texts=texts, model=self.model)
+        use_cache = self.cache.maxsize > 0
+
+        # Without cache, texts are only deduplicated within this call.
+        keys: list[Hashable] = (
+            [self._cache_key(text, kwargs) for text in texts] if use_cache else texts
+        )
+        vectors: list[list[float] | None] = [None] * len(texts)
+        if use_cache:
+            for i, key in enumerate(keys):
+                if (cached := self.cache.get(key)) is not None:
+                    vectors[i] = list(cached)
+
+        # Only embed unique texts missing from cache, in a single request.
+        missing: dict[Hashable, str] = {}
+        for key, text, vector in zip(keys, texts, vectors, strict=True):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        logger.debug(
+            "Embed texts",
+            texts=list(missing.values()),
+            num_cached=len(texts) - sum(x is None for x in vectors),
+            model=self.model,
+        )
+
+        if missing:
+            missing_vectors = await self._embed_batches(
+                list(missing.values()),
+                **kwargs,
+            )
+            if self.normalize:
+                missing_vectors = normalize_vectors(missing_vectors)
+
+            embedded = dict(zip(missing, missing_vectors, strict=True))
+            if use_cache:
+                for key, vector in embedded.items():
+                    self.cache.put(key, tuple(vector))
+
+            # Copy vectors of duplicated texts, so each result is independent.
+            used: set[Hashable] = set()
+            for i, key in enumerate(keys):
+                if vectors[i] is None:
+                    vector = embedded[key]
+                    vectors[i] = list(vector) if key in used else vector
+                    used.add(key)
 
-        return await self.client.embed_texts(texts=texts, **kwargs)
+        return cast(list[list[float]], vectors)
@@ -1,3 +1,4 @@
+import hashlib
 from collections.abc import AsyncGenerator
 
 import structlog
@@ -5,7 +6,9 @@ from llm_taxi.conversation import Message, Role
 from llm_taxi.factory import llm
 
 from hanashi.types import Conversation
+from hanashi.utils.cache import LRUCache
 from hanashi.utils.logging import log_time
+from hanashi.utils.stream import oneshot_stream
 
 logger = structlog.get_logger()
 
@@ -21,13 +24,15 @@ def to_llm_taxi_messages(conversation: Conversation) -> list[Message]:
 
 
 class LLM:
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         *,
         model: str,
         api_key: str | None = None,
         base_url: str | None = None,
         call_kwargs: dict | None = None,
+        cache_size: int = 0,
+        cache_ttl: float | None = None,
         **client_kwargs,
     ) -> None:
         self.model = model
@@ -38,6 +43,33 @@ class LLM:
             call_kwargs=call_kwargs,
             **client_kwargs,
         )
+        # Responses of identical requests, disabled by default.
+        self.cache: LRUCache[str] = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def _cache_key(self, messages: list[Message], kwargs: dict) -> bytes:
+        key = hashlib.blake2b(digest_size=16)
+        key.update(self.model.encode())
+        key.update(b"\x00")
+        key.update(repr(sorted(kwargs.items())).encode())
+        for message in messages:
+            key.update(b"\x1e")
+            key.update(f"{message.role}:{message.content}".encode())
+
+        return key.digest()
+
+    async def _response(self, messages: list[Message], **kwargs) -> str:
+        if self.cache.maxsize <= 0:
+            return await self.client.response(messages, **kwargs)
+
+        key = self._cache_key(messages, kwargs)
+        if (response := self.cache.get(key)) is not None:
+            logger.debug("LLM response cache hit", model=self.model)
+            return response
+
+        response = await self.client.response(messages, **kwargs)
+        self.cache.put(key, response)
+
+        return response
 
     @log_time(
         args=lambda args: {
@@ -57,6 +89,13 @@ class LLM:
             **kwargs,
         )
 
+        # Replay a cached response, streamed responses are not cached themselves.
+        if self.cache.maxsize > 0 and (
+            response := self.cache.get(self._cache_key(messages, kwargs))
+        ) is not None:
+            logger.debug("LLM response cache hit", model=self.model)
+            return oneshot_stream(response)
+
         return await self.client.streaming_response(messages, **kwargs)
 
     @log_time(
@@ -68,4 +107,15 @@ class LLM:
         messages = to_llm_taxi_messages(conversation)
         logger.debug("LLM response", model=self.model, messages=messages, **kwargs)
 
-        return await self.client.response(messages, **kwargs)
+        return await self._response(messages, **kwargs)
+
+    @log_time(
+        args=lambda args: {
+            "model": args["self"].model,
+        },
+    )
+    async def response_from_text(self, content: str, **kwargs) -> str:
+        messages = [Message(role=Role.User, content=content)]
+        logger.debug("LLM response", model=self.model, messages=messages, **kwargs)
+
+        return await self._response(messages, **kwargs)
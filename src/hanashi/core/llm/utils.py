@@ -3,19 +3,75 @@ import json
 import re
 from typing import Any
 
+import orjson
 import structlog
 
 logger = structlog.get_logger()
 
+_INLINE_JSON_PATTERN = re.compile(r"`([^`\n]+)`")
+_MULTI_LINE_JSON_PATTERN = re.compile(r"```(?:json)?(.+?)```", re.S)
+_JSON_TOKEN_PATTERN = re.compile(r'["\\\[\]{}]')
+
+
+def _loads(s: str) -> Any:
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        # orjson rejects NaN and Infinity, which the json module accepts.
+        return json.loads(s)
+
+
+def _find_json_span(s: str) -> tuple[int, int] | None:
+    starts = [i for i in (s.find("{"), s.find("[")) if i >= 0]
+    if not starts:
+        return None
+
+    start = min(starts)
+    depth = 0
+    in_string = False
+    escaped_index = -1
+    # Jump between structural characters instead of walking every character.
+    for match in _JSON_TOKEN_PATTERN.finditer(s, start):
+        i = match.start()
+        if i == escaped_index:
+            continue
+
+        ch = match[0]
+        if in_string:
+            if ch == "\\":
+                escaped_index = i + 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+
+    return None
+
+
+def extract_bracketed_json(s: str) -> Any:
+    data = None
+
+    if span := _find_json_span(s):
+        with contextlib.suppress(json.JSONDecodeError):
+            data = _loads(s[span[0] : span[1]])
+
+    return data
+
 
 def extract_inline_json(s: str) -> Any:
     data = None
 
-    if match := re.search(r"`(.+)`", s):
+    if match := _INLINE_JSON_PATTERN.search(s):
         s = match[1]
 
-    with contextlib.suppress(json.decoder.JSONDecodeError):
-        data = json.loads(s)
+    with contextlib.suppress(json.JSONDecodeError):
+        data = _loads(s)
 
     return data
 
@@ -23,24 +79,29 @@ def extract_inline_json(s: str) -> Any:
 def extract_multi_line_json(s: str) -> Any:
     data = None
 
-    if match := re.search(r"```(?:json)?(.+)```", s, re.S):
+    if match := _MULTI_LINE_JSON_PATTERN.search(s):
         s = match[1]
 
-    with contextlib.suppress(json.decoder.JSONDecodeError):
-        data = json.loads(s)
+    with contextlib.suppress(json.JSONDecodeError):
+        data = _loads(s)
 
     return data
 
 
 def extract_json_from_string(s: str) -> Any:
     data = None
-    with contextlib.suppress(json.decoder.JSONDecodeError):
-        data = json.loads(s)
+    with contextlib.suppress(json.JSONDecodeError):
+        data = _loads(s)
 
     return data
 
 
 def extract_json(s: str) -> Any:
+    # Most responses are a bare JSON document, which a single bracket scan
+    # handles without running the regex passes below.
+    if s.lstrip().startswith(("{", "[")) and (data := extract_bracketed_json(s)):
+        return data
+
     if data := extract_inline_json(s):
         return data
 
@@ -50,4 +111,8 @@ def extract_json(s: str) -> Any:
     if data := extract_json_from_string(s):
         return data
 
+    # Last resort for JSON embedded in prose without any fences.
+    if data := extract_bracketed_json(s):
+        return data
+
     return None
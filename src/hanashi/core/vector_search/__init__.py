@@ -2,6 +2,7 @@ from hanashi.core.vector_search.base import (
     Document,
     ScoredDocument,
     VectorSearch,
+    create_score_matrix,
     filter_search_results,
 )
 from hanashi.core.vector_search.qdrant import Qdrant
@@ -11,5 +12,6 @@ __all__ = [
     "Document",
     "ScoredDocument",
     "Qdrant",
+    "create_score_matrix",
     "filter_search_results",
 ]
@@ -1,6 +1,8 @@
+import asyncio
 from collections.abc import Iterable
 from typing import Any, Generic, TypeVar
 
+import numpy as np
 from pydantic import BaseModel, ConfigDict
 
 T_Document = TypeVar("T_Document")
@@ -21,12 +23,20 @@ class ScoredDocument(BaseModel, Generic[T_Document]):
 
 
 class VectorSearch(Generic[T_Document]):
+    async def embed(self, query: str) -> list[float]:
+        raise NotImplementedError
+
+    async def embed_batch(self, queries: list[str]) -> list[list[float]]:
+        return list(await asyncio.gather(*map(self.embed, queries)))
+
     async def retrieve_documents(
         self,
         query: str,
         limit: int = 10,
         filters: list[dict] | None = None,
         model: type[T_Document] | None = None,
+        score_threshold: float | None = None,
+        query_vector: list[float] | None = None,
         **kwargs,
     ) -> list[ScoredDocument[T_Document]]:
         raise NotImplementedError
@@ -37,10 +47,36 @@ class VectorSearch(Generic[T_Document]):
         limit: int = 10,
         filters: list[dict] | list[list[dict]] | None = None,
         model: type[T_Document] | None = None,
+        score_threshold: float | None = None,
         **kwargs,
     ) -> list[list[ScoredDocument[T_Document]]]:
         raise NotImplementedError
 
+    async def batch_retrieve_documents_soa(
+        self,
+        queries: list[str],
+        limit: int = 10,
+        filters: list[dict] | list[list[dict]] | None = None,
+        model: type[T_Document] | None = None,
+        score_threshold: float | None = None,
+        **kwargs,
+    ) -> tuple[np.ndarray, np.ndarray, list[list[T_Document]]]:
+        batch_results = await self.batch_retrieve_documents(
+            queries,
+            limit,
+            filters=filters,
+            model=model,
+            score_threshold=score_threshold,
+            **kwargs,
+        )
+        scores, mask = create_score_matrix(
+            [[x.score for x in results] for results in batch_results],
+        )
+
+        documents = [[x.document for x in results] for results in batch_results]
+
+        return scores, mask, documents
+
     async def list_documents(
         self,
         limit: int,
@@ -51,6 +87,20 @@ class VectorSearch(Generic[T_Document]):
         raise NotImplementedError
 
 
+def create_score_matrix(
+    batch_scores: list[list[float]],
+) -> tuple[np.ndarray, np.ndarray]:
+    # Missing results are padded with `-inf` and masked out.
+    width = max(map(len, batch_scores), default=0)
+    scores = np.full((len(batch_scores), width), -np.inf, dtype=np.float64)
+    mask = np.zeros((len(batch_scores), width), dtype=bool)
+    for i, row in enumerate(batch_scores):
+        scores[i, : len(row)] = row
+        mask[i, : len(row)] = True
+
+    return scores, mask
+
+
 def filter_search_results(
     results: Iterable[ScoredDocument[T_Document]],
     *,
@@ -58,11 +108,17 @@ def filter_search_results(
     require_score: bool = True,
     keep_score: bool = False,
 ) -> Iterable[ScoredDocument[T_Document]] | Iterable[T_Document]:
-    for result in results:
-        if (
-            not require_score and (not result.score or result.score >= score_threshold)
-        ) or (require_score and (result.score and result.score >= score_threshold)):
-            if keep_score:
-                yield result
-            else:
-                yield result.document
+    results = list(results)
+
+    # Missing (or zero) scores are treated as unscored.
+    scores = np.fromiter(
+        (x.score or np.nan for x in results),
+        dtype=np.float64,
+        count=len(results),
+    )
+    mask = scores >= score_threshold
+    if not require_score:
+        mask |= np.isnan(scores)
+
+    for i in np.flatnonzero(mask).tolist():
+        yield results[i] if keep_score else results[i].document
@@ -1,13 +1,23 @@
+import functools
+import json
 import os
+from collections.abc import Callable
 from typing import Any, TypeVar, cast
 
+import numpy as np
 import structlog
+from pydantic import TypeAdapter
 from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
 
 from hanashi.core.embedding import Embedding
-from hanashi.core.vector_search.base import Document, ScoredDocument, VectorSearch
-from hanashi.utils.logging import log_time
+from hanashi.core.vector_search.base import (
+    Document,
+    ScoredDocument,
+    VectorSearch,
+    create_score_matrix,
+)
+from hanashi.utils.logging import LazyValue, log_time
 
 logger = structlog.get_logger()
 
@@ -15,45 +25,101 @@ logger = structlog.get_logger()
 T_Document = TypeVar("T_Document", bound=Document)
 
 
+@functools.lru_cache(maxsize=128)
+def _get_documents_adapter(model: type[T_Document]) -> TypeAdapter:
+    return TypeAdapter(list[model])
+
+
+def _parse_payloads(
+    payloads: list[Any],
+    model: type[T_Document] | None,
+    *,
+    trusted: bool = False,
+) -> list[Any]:
+    if not model:
+        return payloads
+
+    if trusted:
+        return [model.model_construct(**x) for x in payloads]
+
+    return _get_documents_adapter(model).validate_python(payloads)
+
+
+def _dump_filter(query_filter: models.Filter | None) -> dict | None:
+    return query_filter.model_dump(mode="json") if query_filter else None
+
+
+def _dump_hits(docs: list[models.ScoredPoint]) -> list[dict]:
+    return [
+        {
+            "id": cast(models.Payload, x.payload)["id"],
+            "score": x.score,
+        }
+        for x in docs
+    ]
+
+
 def create_filters(filters) -> models.Filter | None:
     # FIXME Support more complex filters
 
     if not filters:
         return None
 
-    def _create_field_condition(f):
-        if "range" in f:
-            return models.FieldCondition(
-                key=f["key"],
-                range=models.Range(**f["range"]),
-            )
+    try:
+        key = json.dumps(filters, sort_keys=True)
+    except TypeError:
+        # Filters with values which can't be serialized are built uncached.
+        return _create_filters(filters)
+
+    return _create_cached_filters(key)
+
+
+@functools.lru_cache(maxsize=1024)
+def _create_cached_filters(key: str) -> models.Filter:
+    # NOTE: Cached filters are shared between searches and must not be mutated.
+    return _create_filters(json.loads(key))
+
+
+_FIELD_CONDITION_BUILDERS: dict[str, Callable[[dict], models.FieldCondition]] = {
+    "range": lambda f: models.FieldCondition(
+        key=f["key"],
+        range=models.Range(**f["range"]),
+    ),
+    "match_text": lambda f: models.FieldCondition(
+        key=f["key"],
+        match=models.MatchText(**f["match"]),
+    ),
+    "match_any": lambda f: models.FieldCondition(
+        key=f["key"],
+        match=models.MatchAny(**f["match"]),
+    ),
+    "match_value": lambda f: models.FieldCondition(
+        key=f["key"],
+        match=models.MatchValue(**f["match"]),
+    ),
+    "in": lambda f: models.FieldCondition(
+        key=f["key"],
+        match=models.MatchAny(**f["in"]),
+    ),
+}
+
+
+def _create_field_condition(f: dict) -> models.FieldCondition:
+    if "range" in f:
+        kind = "range"
+    elif "match" in f:
+        kind = f"match_{next(iter(f['match']), 'value')}"
+        if kind not in _FIELD_CONDITION_BUILDERS:
+            kind = "match_value"
+    elif "in" in f:
+        kind = "in"
+    else:
+        raise NotImplementedError
 
-        if "match" in f:
-            if "text" in f["match"]:
-                return models.FieldCondition(
-                    key=f["key"],
-                    match=models.MatchText(**f["match"]),
-                )
-
-            if "any" in f["match"]:
-                return models.FieldCondition(
-                    key=f["key"],
-                    match=models.MatchAny(**f["match"]),
-                )
-
-            return models.FieldCondition(
-                key=f["key"],
-                match=models.MatchValue(**f["match"]),
-            )
+    return _FIELD_CONDITION_BUILDERS[kind](f)
 
-        if "in" in f:
-            return models.FieldCondition(
-                key=f["key"],
-                match=models.MatchAny(**f["in"]),
-            )
-
-        raise NotImplementedError
 
+def _create_filters(filters: list[dict]) -> models.Filter:
     must_filters = []
     must_not_filters = []
     should_filters = []
@@ -63,7 +129,6 @@ def create_filters(filters) -> models.Filter | None:
             must_filters.append(f)
             continue
 
-        f.pop("type")
         if type_ == "must_not":
             must_not_filters.append(f)
         elif type_ == "should":
@@ -86,18 +151,36 @@ class Qdrant(VectorSearch):
         vector_name: str | None = None,
         embedding: Embedding,
         timeout: int = 10,
+        prefer_grpc: bool = True,
+        grpc_port: int = 6334,
+        trust_payload: bool = False,
+        hnsw_ef: int | None = None,
     ) -> None:
         if not base_url:
             base_url = os.getenv("QDRANT_URL", "http://localhost:6333")
 
+        # gRPC sends query vectors as packed floats instead of JSON.
         self.qdrant = AsyncQdrantClient(
             base_url,
+            prefer_grpc=prefer_grpc,
+            grpc_port=grpc_port,
             timeout=timeout,
             api_key=api_key,
         )
         self.collection = collection
         self.vector_name = vector_name
         self.embedding = embedding
+        # Skip validation of payloads written by ourselves with the same schema.
+        self.trust_payload = trust_payload
+        self.search_params = (
+            models.SearchParams(hnsw_ef=hnsw_ef, exact=False) if hnsw_ef else None
+        )
+
+    async def embed(self, query: str) -> list[float]:
+        return await self.embedding.embed_text(query)
+
+    async def embed_batch(self, queries: list[str]) -> list[list[float]]:
+        return await self.embedding.embed_texts(queries)
 
     @log_time(
         args=[
@@ -112,9 +195,12 @@ class Qdrant(VectorSearch):
         limit: int = 10,
         filters: list[dict] | None = None,
         model: type[T_Document] | None = None,
+        score_threshold: float | None = None,
+        query_vector: list[float] | None = None,
         **_kwargs,
     ) -> list[ScoredDocument]:
-        query_vector = await self.embedding.embed_text(query)
+        if query_vector is None:
+            query_vector = await self.embed(query)
 
         if not self.vector_name:
             query_vector_params: list[float] | tuple[str, list[float]] = query_vector
@@ -124,52 +210,43 @@ class Qdrant(VectorSearch):
         query_filter = create_filters(filters)
         logger.info(
             "Parsed search filters",
-            query_filter=query_filter.dict() if query_filter else None,
+            query_filter=LazyValue(_dump_filter, query_filter),
         )
 
         docs = await self.qdrant.search(
             collection_name=f"{self.collection}",
             query_vector=query_vector_params,
             query_filter=query_filter,
+            search_params=self.search_params,
             limit=limit,
             with_payload=True,
+            score_threshold=score_threshold,
         )
         logger.info(
             "Retrieved documents",
             query=query,
             num_documents=len(docs),
-            ids=[
-                {
-                    "id": cast(models.Payload, x.payload)["id"],
-                    "score": x.score,
-                }
-                for x in docs
-            ],
+            ids=LazyValue(_dump_hits, docs),
+        )
+
+        documents = _parse_payloads(
+            [x.payload for x in docs],
+            model,
+            trusted=self.trust_payload,
         )
 
         return [
-            ScoredDocument(
-                document=model.parse_obj(x.payload) if model else x.payload,
-                score=x.score,
-            )
-            for x in docs
+            ScoredDocument(document=document, score=x.score)
+            for document, x in zip(documents, docs, strict=True)
         ]
 
-    @log_time(
-        args=[
-            "queries",
-            "limit",
-            "filters",
-        ],
-    )
-    async def batch_retrieve_documents(
+    async def _search_batch(
         self,
         queries: list[str],
-        limit: int = 10,
-        filters: list[dict] | list[list[dict]] | None = None,
-        model: type[T_Document] | None = None,
-        **_kwargs,
-    ) -> list[list[ScoredDocument]]:
+        limit: int,
+        filters: list[dict] | list[list[dict]] | None,
+        score_threshold: float | None,
+    ) -> list[list[models.ScoredPoint]]:
         if not filters:
             query_filters = [None] * len(queries)
         elif isinstance(filters[0], dict):
@@ -180,7 +257,7 @@ class Qdrant(VectorSearch):
 
         logger.info(
             "Parsed batch search filters",
-            query_filters=[x.dict() if x is not None else x for x in query_filters],
+            query_filters=LazyValue(lambda: list(map(_dump_filter, query_filters))),
             collection_name=self.collection,
         )
 
@@ -193,8 +270,10 @@ class Qdrant(VectorSearch):
                     else models.NamedVector(name=self.vector_name, vector=vector)
                 ),
                 filter=filters,
+                params=self.search_params,
                 limit=limit,
                 with_payload=True,
+                score_threshold=score_threshold,
             )
             for vector, filters in zip(query_vectors, query_filters, strict=True)
         ]
@@ -207,26 +286,77 @@ class Qdrant(VectorSearch):
                 "Retrieved documents",
                 query=query,
                 num_documents=len(docs),
-                ids=[
-                    {
-                        "id": cast(models.Payload, x.payload)["id"],
-                        "score": x.score,
-                    }
-                    for x in docs
-                ],
+                ids=LazyValue(_dump_hits, docs),
             )
 
+        return batch_docs
+
+    def _parse_batch_payloads(
+        self,
+        batch_docs: list[list[models.ScoredPoint]],
+        model: type[T_Document] | None,
+    ) -> list[list[Any]]:
+        # Validate payloads of all queries at once, then split them per query.
+        documents = iter(
+            _parse_payloads(
+                [x.payload for docs in batch_docs for x in docs],
+                model,
+                trusted=self.trust_payload,
+            ),
+        )
+
+        return [[next(documents) for _ in docs] for docs in batch_docs]
+
+    @log_time(
+        args=[
+            "queries",
+            "limit",
+            "filters",
+        ],
+    )
+    async def batch_retrieve_documents(
+        self,
+        queries: list[str],
+        limit: int = 10,
+        filters: list[dict] | list[list[dict]] | None = None,
+        model: type[T_Document] | None = None,
+        score_threshold: float | None = None,
+        **_kwargs,
+    ) -> list[list[ScoredDocument]]:
+        batch_docs = await self._search_batch(queries, limit, filters, score_threshold)
+        batch_documents = self._parse_batch_payloads(batch_docs, model)
+
         return [
             [
-                ScoredDocument(
-                    document=model.parse_obj(x.payload) if model else x.payload,
-                    score=x.score,
-                )
-                for x in docs
+                ScoredDocument(document=document, score=x.score)
+                for document, x in zip(documents, docs, strict=True)
             ]
-            for docs in batch_docs
+            for documents, docs in zip(batch_documents, batch_docs, strict=True)
         ]
 
+    @log_time(
+        args=[
+            "queries",
+            "limit",
+            "filters",
+        ],
+    )
+    async def batch_retrieve_documents_soa(
+        self,
+        queries: list[str],
+        limit: int = 10,
+        filters: list[dict] | list[list[dict]] | None = None,
+        model: type[T_Document] | None = None,
+        score_threshold: float | None = None,
+        **_kwargs,
+    ) -> tuple[np.ndarray, np.ndarray, list[list[Any]]]:
+        batch_docs = await self._search_batch(queries, limit, filters, score_threshold)
+        scores, mask = create_score_matrix(
+            [[x.score for x in docs] for docs in batch_docs],
+        )
+
+        return scores, mask, self._parse_batch_payloads(batch_docs, model)
+
     @log_time(
         task="qdrant_retriever.list_documents",
         args=[
@@ -244,7 +374,7 @@ class Qdrant(VectorSearch):
         query_filter = create_filters(filters)
         logger.info(
             "Parsed listing filters",
-            query_filter=query_filter.model_dump() if query_filter else None,
+            query_filter=LazyValue(_dump_filter, query_filter),
         )
 
         docs, _ = await self.qdrant.scroll(
@@ -256,4 +386,8 @@ class Qdrant(VectorSearch):
             scroll_filter=query_filter,
         )
 
-        return [model.parse_obj(x.payload) if model else x.payload for x in docs]
+        return _parse_payloads(
+            [x.payload for x in docs],
+            model,
+            trusted=self.trust_payload,
+        )
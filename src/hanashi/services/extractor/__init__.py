@@ -3,7 +3,7 @@ from pydantic import BaseModel
 
 from hanashi.core.llm import LLM
 from hanashi.core.llm.utils import extract_json
-from hanashi.types.conversation import Conversation, Message, Role
+from hanashi.types.conversation import Conversation
 
 logger = structlog.get_logger()
 
@@ -27,9 +27,7 @@ class Extractor:
         logger.debug("Formatted extraction prompt", content=content)
 
         # Response
-        task = Conversation()
-        task.add(Message(role=Role.User, content=content))
-        return await self.llm.response(task, **kwargs)
+        return await self.llm.response_from_text(content, **kwargs)
 
     def _post_process(self, response: str) -> list[Entity]:
         logger.debug("LLM response for extraction", response=response)
@@ -44,7 +42,7 @@ class Extractor:
 
             for entity_name in entity_names:
                 if entity_name := entity_name.strip():
-                    entities += [Entity(type=entity_type, name=entity_name)]
+                    entities.append(Entity(type=entity_type, name=entity_name))
 
         logger.info("LLM Extracted entities", entities=entities)
 
@@ -1,16 +1,15 @@
 import asyncio
 from collections.abc import Callable
-from typing import Generic, TypeVar, cast
+from typing import Any, Generic, TypeVar, cast
 
+import numpy as np
 import structlog
 from pydantic import BaseModel
 
 from hanashi.core.llm import LLM
-from hanashi.core.vector_search import filter_search_results
-from hanashi.core.vector_search.base import ScoredDocument, VectorSearch
+from hanashi.core.vector_search.base import VectorSearch
 from hanashi.services.extractor import Entity
-from hanashi.types import Conversation, Message
-from hanashi.types.conversation import Role
+from hanashi.types import Conversation
 
 logger = structlog.get_logger()
 
@@ -24,6 +23,16 @@ class LinkerResponse(BaseModel):
     unlinked_entities: list[Entity]
 
 
+def _to_metadata(candidate: Any) -> dict:
+    # Candidates come from our own vector search, so linked entities are built
+    # without validation; only documents parsed into models need converting.
+    if isinstance(candidate, BaseModel):
+        return candidate.model_dump()
+
+    # Copy, as mentions of the same entity share one search result.
+    return dict(candidate)
+
+
 T_LinkedEntity = TypeVar("T_LinkedEntity", bound=LinkedEntity)
 CandidatePostProcessFunction = Callable[
     [Entity, list[T_LinkedEntity]],
@@ -57,6 +66,28 @@ class Linker(Generic[T_LinkedEntity]):
         self.candidate_postprocess_fns = candidate_postprocess_fns
         self.skip_llm_check_confidence = skip_llm_check_confidence
 
+    def _link_without_check(
+        self,
+        entity: Entity,
+        documents: list[T_LinkedEntity],
+        scores: np.ndarray,
+        index: int,
+    ) -> LinkedEntity:
+        link_entity = LinkedEntity.model_construct(
+            type=entity.type,
+            name=entity.name,
+            metadata=_to_metadata(documents[index]),
+        )
+        logger.info(
+            "Link entity and skip LLM check",
+            skip_check_confidence=self.skip_llm_check_confidence,
+            score=float(scores[index]),
+            entity=entity,
+            link_entity=link_entity,
+        )
+
+        return link_entity
+
     async def _retrieve_candidates(
         self,
         _query: str,
@@ -67,55 +98,87 @@ class Linker(Generic[T_LinkedEntity]):
         # TODO: Integrate with _query information
         # TODO: Handle non-string entities correctly.
         unlinked_entities: list[Entity] = []
-        to_link_entities: list[Entity] = []
+        to_link_entities: list[tuple[Entity, int]] = []
+
+        # Entities with the same name and type share a single search.
+        query_indices: dict[tuple[str, str], int] = {}
+        queries: list[str] = []
+        filters: list[list[dict]] = []
         for entity in entities:
-            if isinstance(entity.name, str):
-                to_link_entities += [entity]
-            else:
-                unlinked_entities += [entity]
+            if not isinstance(entity.name, str):
+                unlinked_entities.append(entity)
+                continue
+
+            key = (entity.name, entity.type)
+            if key not in query_indices:
+                query_indices[key] = len(queries)
+                queries.append(entity.name)
+                filters.append(
+                    [  # Filter points using entity `type` information.
+                        {
+                            "key": "type",
+                            "in": {
+                                "any": [
+                                    entity.type,
+                                    *self.cross_search_types.get(entity.type, []),
+                                ],
+                            },
+                        },
+                    ],
+                )
+            to_link_entities.append((entity, query_indices[key]))
 
         if not to_link_entities:
             return [], unlinked_entities, []
 
-        filters = [
-            [  # Filter points using entity `type` information.
-                {
-                    "key": "type",
-                    "in": {
-                        "any": [
-                            entity.type,
-                            *self.cross_search_types.get(entity.type, []),
-                        ],
-                    },
-                },
-            ]
-            for entity in to_link_entities
-        ]
-        batch_response = await self.vector_search.batch_retrieve_documents(
-            [x.name for x in to_link_entities],
+        (
+            scores,
+            mask,
+            batch_documents,
+        ) = await self.vector_search.batch_retrieve_documents_soa(
+            queries,
             limit=top_k,
             filters=filters,
+            score_threshold=score_threshold,
         )
-        batch_docs = [
-            list(
-                cast(
-                    list[ScoredDocument[T_LinkedEntity]],
-                    filter_search_results(
-                        docs,
-                        score_threshold=score_threshold,
-                        require_score=True,
-                        keep_score=True,
-                    ),
-                ),
-            )
-            for docs in batch_response
-        ]
+
+        # Check candidates of all queries at once.
+        keep = mask & (scores >= score_threshold)
+        if self.skip_llm_check_confidence and keep.size:
+            confident = keep & (scores > self.skip_llm_check_confidence)
+            # LLM check is only skipped if exactly one candidate is confident.
+            skip_check = confident.sum(axis=1) == 1
+            skip_check_indices = confident.argmax(axis=1)
+        else:
+            skip_check = np.zeros(len(queries), dtype=bool)
+            skip_check_indices = np.zeros(len(queries), dtype=np.intp)
 
         linked_entities: list[LinkedEntity] = []
         entity_with_candidates: list[dict] = []
-        for entity, docs_with_scores in zip(to_link_entities, batch_docs, strict=True):
-            docs = [x.document for x in docs_with_scores]
-            if process_fn := self.candidate_postprocess_fns.get(entity.type):
+        for entity, query_index in to_link_entities:
+            query_documents = cast(
+                list[T_LinkedEntity],
+                batch_documents[query_index],
+            )
+            process_fn = self.candidate_postprocess_fns.get(entity.type)
+
+            # Confident entities are linked directly unless their candidates
+            # have to be post processed first.
+            if skip_check[query_index] and not process_fn:
+                linked_entities.append(
+                    self._link_without_check(
+                        entity,
+                        query_documents,
+                        scores[query_index],
+                        skip_check_indices[query_index],
+                    ),
+                )
+                continue
+
+            docs = [
+                query_documents[i] for i in np.flatnonzero(keep[query_index]).tolist()
+            ]
+            if process_fn:
                 processed_docs = process_fn(entity, docs)
                 logger.info(
                     "Post processing linking candidates",
@@ -127,141 +190,157 @@ class Linker(Generic[T_LinkedEntity]):
                 docs = processed_docs
 
             # That means if a entity with no candidates is ignored here.
-            if docs:
-                if self.skip_llm_check_confidence:
-                    skip_check_docs = [
-                        x
-                        for x in docs_with_scores
-                        if x.score > self.skip_llm_check_confidence
-                    ]
-                    if len(skip_check_docs) == 1:
-                        link_entity = LinkedEntity(
-                            type=entity.type,
-                            name=entity.name,
-                            metadata=cast(dict, skip_check_docs[0].document),
-                        )
-                        linked_entities += [link_entity]
-                        logger.info(
-                            "Link entity and skip LLM check",
-                            skip_check_confidence=self.skip_llm_check_confidence,
-                            score=skip_check_docs[0].score,
-                            entity=entity,
-                            link_entity=link_entity,
-                        )
-                        continue
-
-                entity_with_candidates += [
-                    {
-                        "entity": entity,
-                        # NOTE: `name` key is required
-                        "candidates": docs,
-                    },
-                ]
-
-            else:
+            if not docs:
                 logger.warning(
                     "No linking candidates found",
                     type=entity.type,
                     name=entity.name,
                 )
-                unlinked_entities += [entity]
+                unlinked_entities.append(entity)
+                continue
 
-        return entity_with_candidates, unlinked_entities, linked_entities
+            if skip_check[query_index]:
+                linked_entities.append(
+                    self._link_without_check(
+                        entity,
+                        query_documents,
+                        scores[query_index],
+                        skip_check_indices[query_index],
+                    ),
+                )
+                continue
 
-    async def _link_by_llm(
-        self,
-        query: str,
-        entities_with_candidates: list[dict],
-        **kwargs,
-    ) -> tuple[list[LinkedEntity], list[Entity]]:
-        # Make request for every entity
-        futures = []
-        for entity_with_candidates in entities_with_candidates:
-            content = self.prompt_template.format(
-                entity_type=entity_with_candidates["entity"].type,
-                entity_name=entity_with_candidates["entity"].name,
-                text=query,
-                normalized_entities="\n".join(
-                    f"{i + 1}. {self.candiate_format_function(candidate) if self.candiate_format_function else candidate['name']}"
-                    for i, candidate in enumerate(entity_with_candidates["candidates"])
-                ),
+            entity_with_candidates.append(
+                {
+                    "entity": entity,
+                    # NOTE: `name` key is required
+                    "candidates": docs,
+                },
             )
 
-            logger.debug("Formatted prompt", content=content)
+        return entity_with_candidates, unlinked_entities, linked_entities
 
-            task = Conversation()
-            task.add(Message(role=Role.User, content=content))
+    def _format_prompt(self, query: str, entity_with_candidates: dict) -> str:
+        content = self.prompt_template.format(
+            entity_type=entity_with_candidates["entity"].type,
+            entity_name=entity_with_candidates["entity"].name,
+            text=query,
+            normalized_entities="\n".join(
+                f"{i + 1}. {self.candiate_format_function(candidate) if self.candiate_format_function else candidate['name']}"
+                for i, candidate in enumerate(entity_with_candidates["candidates"])
+            ),
+        )
 
-            futures += [self.llm.response(task, **kwargs)]
+        logger.debug("Formatted prompt", content=content)
 
-        # Gather results concurrently
-        responses = await asyncio.gather(*futures)
+        return content
 
-        # Verify generated results from LLM
-        linked_entities: list[LinkedEntity] = []
-        unlinked_entities: list[Entity] = []
-        for request_index, (entity_with_candidates, response) in enumerate(
-            zip(
-                entities_with_candidates,
-                responses,
-                strict=True,
-            ),
-        ):
-            entity = entity_with_candidates["entity"]
+    def _parse_response(
+        self,
+        request_index: int,
+        entity_with_candidates: dict,
+        response: str,
+    ) -> LinkedEntity | Entity | None:
+        # Returns the linked entity, the unlinked entity, or `None` if the
+        # response can't be parsed.
+        entity = entity_with_candidates["entity"]
 
-            logger.info(
-                "LLM response for linking",
-                candidates=entity_with_candidates["candidates"],
+        logger.info(
+            "LLM response for linking",
+            candidates=entity_with_candidates["candidates"],
+            response=response,
+            request_index=request_index,
+        )
+
+        try:
+            index = int(response) - 1
+        except ValueError:
+            logger.warning(
+                "LLM generated unparsable response",
+                entity_name=entity.name,
                 response=response,
                 request_index=request_index,
             )
+            return None
 
-            try:
-                index = int(response) - 1
-            except ValueError:
-                logger.warning(
-                    "LLM generated unparsable response",
-                    entity_name=entity.name,
-                    response=response,
-                    request_index=request_index,
-                )
-                continue
-
-            # LLM generates unexpected contents
-            if index > len(entity_with_candidates["candidates"]):
-                logger.warning(
-                    "LLM generated unexpected candidate index",
-                    index=index,
-                    entity_name=entity.name,
-                    request_index=request_index,
-                )
-                unlinked_entities += [entity]
-                continue
-
-            if index < 0:
-                logger.info(
-                    "No suitable candidate found for linking",
-                    index=index,
-                    entity_name=entity.name,
-                    request_index=request_index,
-                )
-                unlinked_entities += [entity]
-                continue
+        # LLM generates unexpected contents
+        if index > len(entity_with_candidates["candidates"]):
+            logger.warning(
+                "LLM generated unexpected candidate index",
+                index=index,
+                entity_name=entity.name,
+                request_index=request_index,
+            )
+            return entity
 
-            normailzed_entity = entity_with_candidates["candidates"][index]
-            linked_entities += [
-                LinkedEntity(
-                    type=entity.type,
-                    name=entity.name,
-                    metadata=normailzed_entity,
-                ),
-            ]
+        if index < 0:
             logger.info(
-                "LLM generate normalized entity",
-                normailzed_entity=normailzed_entity,
+                "No suitable candidate found for linking",
+                index=index,
                 entity_name=entity.name,
                 request_index=request_index,
             )
+            return entity
+
+        normailzed_entity = entity_with_candidates["candidates"][index]
+        linked_entity = LinkedEntity.model_construct(
+            type=entity.type,
+            name=entity.name,
+            metadata=_to_metadata(normailzed_entity),
+        )
+        logger.info(
+            "LLM generate normalized entity",
+            normailzed_entity=normailzed_entity,
+            entity_name=entity.name,
+            request_index=request_index,
+        )
+
+        return linked_entity
+
+    async def _link_by_llm(
+        self,
+        query: str,
+        entities_with_candidates: list[dict],
+        **kwargs,
+    ) -> tuple[list[LinkedEntity], list[Entity]]:
+        async def _respond(
+            request_index: int,
+            entity_with_candidates: dict,
+        ) -> tuple[int, str]:
+            response = await self.llm.response_from_text(
+                self._format_prompt(query, entity_with_candidates),
+                **kwargs,
+            )
+
+            return request_index, response
+
+        # Make request for every entity
+        tasks = [
+            asyncio.create_task(_respond(request_index, entity_with_candidates))
+            for request_index, entity_with_candidates in enumerate(
+                entities_with_candidates,
+            )
+        ]
+
+        # Verify generated results from LLM as soon as they arrive
+        results: list[LinkedEntity | Entity | None] = [None] * len(tasks)
+        try:
+            for future in asyncio.as_completed(tasks):
+                request_index, response = await future
+                results[request_index] = self._parse_response(
+                    request_index,
+                    entities_with_candidates[request_index],
+                    response,
+                )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        linked_entities = [x for x in results if isinstance(x, LinkedEntity)]
+        unlinked_entities = [
+            x for x in results if x is not None and not isinstance(x, LinkedEntity)
+        ]
 
         return linked_entities, unlinked_entities
 
@@ -1,7 +1,11 @@
+import asyncio
 import itertools
+import json
+import math
 from collections.abc import Callable
-from typing import Generic, cast
+from typing import Any, Generic, cast
 
+import numpy as np
 import structlog
 from pydantic import BaseModel
 
@@ -10,28 +14,52 @@ from hanashi.core.vector_search.base import VectorSearch
 from hanashi.core.vector_search.qdrant import T_Document
 from hanashi.services.rag.base import BaseRetriever
 from hanashi.types import Conversation
-from hanashi.utils.text import count_approximate_tokens
+from hanashi.utils.cache import ProximityCache
+from hanashi.utils.text import count_approximate_tokens_batch, simhash
 
 logger = structlog.get_logger()
 
 
-def merge_docuemnt_splits(docs: list[T_Document]) -> list[T_Document]:
-    docs = sorted(docs, key=lambda x: (x.id is None, x.source_id))
-    groups = itertools.groupby(docs, key=lambda x: x.source_id)
+def merge_document_splits(docs: list[T_Document]) -> list[T_Document]:
+    groups: dict[Any, list[T_Document]] = {}
+    for doc in docs:
+        groups.setdefault(doc.source_id, []).append(doc)
 
-    merged_docs = []
-    for _key, group in groups:
-        group_docs: list[T_Document] = []
-        for doc in group:
-            if doc.index == 0:
-                group_docs = [doc]
-                break
+    merged_docs: list[T_Document] = []
+    for group_docs in groups.values():
+        if first_split := next((x for x in group_docs if x.index == 0), None):
+            merged_docs.append(first_split)
+        else:
+            merged_docs.extend(group_docs)
 
-            group_docs += [doc]
+    return merged_docs
 
-        merged_docs += group_docs
 
-    return merged_docs
+def drop_near_duplicates(
+    docs: list[T_Document],
+    *,
+    max_distance: int = 3,
+) -> list[T_Document]:
+    fingerprints: list[int] = []
+    kept_docs: list[T_Document] = []
+    for doc in docs:
+        fingerprint = simhash(doc.content)
+        if all((fingerprint ^ x).bit_count() > max_distance for x in fingerprints):
+            fingerprints.append(fingerprint)
+            kept_docs.append(doc)
+
+    return kept_docs
+
+
+def canonical_document_order(doc: T_Document) -> tuple:
+    # Documents without source or index are ordered last.
+    return (
+        doc.source_id is None,
+        doc.source_id or "",
+        doc.index is None,
+        doc.index or 0,
+        doc.id,
+    )
 
 
 def post_process_documents(
@@ -41,6 +69,7 @@ def post_process_documents(
     max_length_per_doc: int | None = None,
     merge_splits: bool = True,
     sort_by: Callable | None = None,
+    semantic_dedup: bool = False,
 ) -> list[T_Document]:
     docs = cast(
         list[T_Document],
@@ -58,13 +87,29 @@ def post_process_documents(
         num_remaining_documents=len(docs),
     )
 
-    docs = list({x.id: x for x in docs}.values())
+    seen_ids: set[str] = set()
+    unique_docs: list[T_Document] = []
+    for doc in docs:
+        if doc.id not in seen_ids:
+            seen_ids.add(doc.id)
+            unique_docs.append(doc)
+    docs = unique_docs
     logger.info("Deduplicated documents", num_unique_documents=len(docs))
 
+    if semantic_dedup:
+        # Drop documents with (almost) the same content but different ids.
+        docs = drop_near_duplicates(docs)
+        logger.info("Dropped near duplicate documents", num_unique_documents=len(docs))
+
     if max_length_per_doc:
-        docs = [
-            x for x in docs if count_approximate_tokens(x.content) < max_length_per_doc
-        ]
+        # Tokenize all documents in one call and compare lengths at once.
+        lengths = np.fromiter(
+            count_approximate_tokens_batch([x.content for x in docs]),
+            dtype=np.int64,
+            count=len(docs),
+        )
+        keep = (lengths < max_length_per_doc).tolist()
+        docs = [x for x, k in zip(docs, keep, strict=True) if k]
         logger.info(
             "Filter documents by max length",
             max_length_per_doc=max_length_per_doc,
@@ -72,7 +117,7 @@ def post_process_documents(
         )
 
     if merge_splits:
-        docs = merge_docuemnt_splits(docs)
+        docs = merge_document_splits(docs)
         logger.info("Merge documents by", num_remaining_documents=len(docs))
 
     if sort_by:
@@ -89,13 +134,17 @@ class RetrieveParams(BaseModel, Generic[T_Document]):
 
 
 class VectorSearchRetriever(BaseRetriever, Generic[T_Document]):
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         vector_search: VectorSearch,
         filters: list[dict] | None = None,
         max_length_per_doc: int | None = None,
         merge_splits: bool = True,
         sort_by: Callable | None = None,
+        canonical_order: bool = False,
+        semantic_dedup: bool = False,
+        cache_size: int = 0,
+        cache_tolerance: float = 0.05,
     ) -> None:
         self.vector_search = vector_search
 
@@ -106,41 +155,145 @@ class VectorSearchRetriever(BaseRetriever, Generic[T_Document]):
         self.max_length_per_doc = max_length_per_doc
         self.merge_splits = merge_splits
         self.sort_by = sort_by
+        # Order documents by source instead of relevance, so prompts built from the
+        # same documents share a prefix which LLM servers can cache.
+        self.canonical_order = canonical_order
+        self.semantic_dedup = semantic_dedup
 
-    async def retrieve(
+        # Reuse retrieved documents of semantically close queries.
+        self.cache: ProximityCache[list[ScoredDocument]] | None = (
+            ProximityCache(maxsize=cache_size, tolerance=cache_tolerance)
+            if cache_size > 0
+            else None
+        )
+
+    async def _retrieve_documents(
         self,
-        *,
-        conversation: Conversation,
+        query: str,
         params: RetrieveParams,
-    ) -> list[T_Document]:
-        filters = params.filters if params.filters else []
-        filters += self.filters
+        filters: list[dict],
+        query_vector: list[float] | None = None,
+    ) -> list[ScoredDocument]:
+        if self.cache is None:
+            return await self.vector_search.retrieve_documents(
+                query,
+                params.top_k,
+                filters=filters,
+                model=params.model,
+                query_vector=query_vector,
+            )
 
-        # Retrieve related documents
-        query = conversation.last().content
+        if query_vector is None:
+            query_vector = await self.vector_search.embed(query)
+        namespace = (
+            params.top_k,
+            json.dumps(filters, sort_keys=True, default=str),
+            params.model,
+        )
+        if (docs := self.cache.get(query_vector, namespace)) is not None:
+            logger.info(
+                "Retrieval cache hit",
+                query=query,
+                hits=self.cache.hits,
+                misses=self.cache.misses,
+            )
+            return docs
+
+        logger.info(
+            "Retrieval cache miss",
+            query=query,
+            hits=self.cache.hits,
+            misses=self.cache.misses,
+        )
         docs = await self.vector_search.retrieve_documents(
             query,
             params.top_k,
             filters=filters,
             model=params.model,
+            query_vector=query_vector,
         )
-        logger.info(
-            "Retrieved documents",
-            query=query,
-            num_documents=len(docs),
-        )
+        self.cache.put(query_vector, docs, namespace)
 
-        # Post processing
+        return docs
+
+    def _post_process_documents(
+        self,
+        docs: list[ScoredDocument],
+        params: RetrieveParams,
+    ) -> list[T_Document]:
         docs = post_process_documents(
             docs,
             score_threshold=params.score_threshold,
             max_length_per_doc=self.max_length_per_doc,
             merge_splits=self.merge_splits,
-            sort_by=self.sort_by,
+            sort_by=None if self.canonical_order else self.sort_by,
+            semantic_dedup=self.semantic_dedup,
         )
+        if self.canonical_order and self.sort_by:
+            # Break ties of sort_by deterministically, sorting is stable.
+            docs.sort(key=canonical_document_order)
+            docs.sort(key=self.sort_by)
+
         logger.info(
             "Post processing of documents, will only keep top k documents",
             num_remaining_documents=len(docs),
             top_k=params.top_k,
         )
-        return docs[: params.top_k]
+        docs = docs[: params.top_k]
+
+        if self.canonical_order and not self.sort_by:
+            docs.sort(key=canonical_document_order)
+
+        return docs
+
+    async def retrieve(
+        self,
+        *,
+        conversation: Conversation,
+        params: RetrieveParams,
+    ) -> list[T_Document]:
+        filters = [*(params.filters or []), *self.filters]
+
+        # Retrieve related documents
+        query = conversation.last().content
+        docs = await self._retrieve_documents(query, params, filters)
+        logger.info(
+            "Retrieved documents",
+            query=query,
+            num_documents=len(docs),
+        )
+
+        # Post processing
+        return self._post_process_documents(docs, params)
+
+    async def retrieve_many(
+        self,
+        *,
+        queries: list[str],
+        params: RetrieveParams,
+    ) -> list[T_Document]:
+        filters = [*(params.filters or []), *self.filters]
+
+        # Embed all queries in a single request, then search concurrently
+        query_vectors = await self.vector_search.embed_batch(queries)
+        batch_docs = await asyncio.gather(
+            *(
+                self._retrieve_documents(query, params, filters, query_vector)
+                for query, query_vector in zip(queries, query_vectors, strict=True)
+            ),
+        )
+        logger.info(
+            "Retrieved documents",
+            queries=queries,
+            num_documents=[len(x) for x in batch_docs],
+        )
+
+        # Rank documents of all queries together, so deduplication keeps the best
+        # scored hit of each document.
+        docs = sorted(
+            itertools.chain.from_iterable(batch_docs),
+            key=lambda x: -x.score if x.score is not None else math.inf,
+        )
+
+        # Post processing
+        return self._post_process_documents(docs, params)
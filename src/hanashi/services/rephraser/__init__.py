@@ -1,8 +1,10 @@
+import asyncio
+
 import structlog
 
 from hanashi.core.llm import LLM
 from hanashi.core.llm.utils import extract_json
-from hanashi.types.conversation import Conversation, Message, Role
+from hanashi.types.conversation import Conversation
 
 logger = structlog.get_logger()
 
@@ -33,13 +35,11 @@ class Rephraser:
         content = self._format_template(conversation, num_questions=num_questions)
         logger.debug("Formatted rephrasing template", content=content)
 
-        task = Conversation()
-        task.add(Message(role=Role.User, content=content))
-
-        response = await self.llm.response(task, **kwargs)
+        response = await self.llm.response_from_text(content, **kwargs)
         logger.debug("LLM response for rephrasing", response=response)
 
-        rephrased_questions = extract_json(response)
+        # Parse off the event loop, large responses may take a while.
+        rephrased_questions = await asyncio.to_thread(extract_json, response)
         logger.info("Rephrased questions", rephrased_questions=rephrased_questions)
 
         return rephrased_questions
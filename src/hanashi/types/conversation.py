@@ -1,12 +1,15 @@
 import copy
+import dataclasses
 import enum
-from collections.abc import Iterable
+import functools
 from typing import Any, Literal
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 from hanashi.types.utils import uuid
 
+DEFAULT_MESSAGE_TEMPLATE = "[{role}]: {content} "
+
 
 class Role(str, enum.Enum):
     System = "system"
@@ -14,13 +17,26 @@ class Role(str, enum.Enum):
     Assistant = "assistant"
 
 
-class Message(BaseModel):
-    model_config = ConfigDict(extra="forbid")
+# Messages are created on hot paths, so they are plain dataclasses which are only
+# validated by pydantic at boundaries, e.g. as a field of Conversation.
+@dataclasses.dataclass(slots=True, kw_only=True)
+class Message:
+    __pydantic_config__ = ConfigDict(extra="forbid")
 
-    id: str = Field(default_factory=uuid)
+    id: str = dataclasses.field(default_factory=uuid)
     role: Role
     content: str
-    metadata: dict = Field(default_factory=dict)
+    metadata: dict = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.role = Role(self.role)
+
+    @classmethod
+    def model_validate(cls, obj: Any) -> "Message":
+        return _get_message_adapter().validate_python(obj)
+
+    def model_dump(self, **kwargs) -> dict[str, Any]:
+        return _get_message_adapter().dump_python(self, **kwargs)
 
     def add_metadata(self, key: str, value: Any) -> None:
         self.metadata[key] = value
@@ -29,6 +45,11 @@ class Message(BaseModel):
         return self.metadata.get(key, default)
 
 
+@functools.cache
+def _get_message_adapter() -> TypeAdapter[Message]:
+    return TypeAdapter(Message)
+
+
 class Conversation(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
@@ -41,15 +62,22 @@ class Conversation(BaseModel):
     def get_system_message(self, *, which: Literal["first", "last"]) -> Message | None:
         messages = self.messages if which == "first" else reversed(self.messages)
 
-        return next((x for x in messages if x.role == Role.System), None)
+        return next((x for x in messages if x.role is Role.System), None)
 
     def update_system_message(self, message: Message) -> None:
-        messages = [message]
-        for message in self.messages:
-            if message.role != Role.System:
-                messages += [message]
+        # Replace in place when the only system message is already first.
+        if (
+            self.messages
+            and self.messages[0].role is Role.System
+            and all(x.role is not Role.System for x in self.messages[1:])
+        ):
+            self.messages[0] = message
+            return
 
-        self.messages = messages
+        self.messages = [
+            message,
+            *(x for x in self.messages if x.role is not Role.System),
+        ]
 
     def insert(self, index: int, message: Message) -> None:
         self.messages.insert(index, message)
@@ -60,11 +88,19 @@ class Conversation(BaseModel):
     def last(self) -> Message:
         return self.messages[-1]
 
-    def history(self) -> Iterable[Message]:
-        yield from iter(self.messages[:-1])
+    def history(self) -> list[Message]:
+        return self.messages[:-1]
 
     def clone(self) -> "Conversation":
-        return copy.deepcopy(self)
+        # Messages are copied individually so only their metadata is deep-copied.
+        return self.model_copy(
+            update={
+                "messages": [
+                    dataclasses.replace(x, metadata=copy.deepcopy(x.metadata))
+                    for x in self.messages
+                ],
+            },
+        )
 
     def new(
         self,
@@ -85,13 +121,13 @@ class Conversation(BaseModel):
         *,
         include_system_message: bool = False,
         include_last: bool = True,
-        message_template="[{role}]: {content} ",
+        message_template: str = DEFAULT_MESSAGE_TEMPLATE,
         newline: str = "\n\n",
         limit: int | None = None,
     ) -> str:
         messages = self.messages
         if not include_system_message:
-            messages = [x for x in messages if x.role != Role.System]
+            messages = [x for x in messages if x.role is not Role.System]
 
         if not include_last:
             messages = messages[:-1]
@@ -99,6 +135,12 @@ class Conversation(BaseModel):
         if limit is not None:
             messages = messages[-limit:]
 
+        if message_template == DEFAULT_MESSAGE_TEMPLATE:
+            return newline.join([f"[{x.role.value}]: {x.content} " for x in messages])
+
         return newline.join(
-            message_template.format(role=x.role, content=x.content) for x in messages
+            [
+                message_template.format(role=x.role.value, content=x.content)
+                for x in messages
+            ],
         )
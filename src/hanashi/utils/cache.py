@@ -0,0 +1,119 @@
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+class LRUCache(Generic[T]):
+    def __init__(self, *, maxsize: int, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> T | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+
+        return value
+
+    def put(self, key: Hashable, value: T) -> None:
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else math.inf
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class ProximityCache(Generic[T]):
+    def __init__(self, *, maxsize: int, tolerance: float) -> None:
+        self.maxsize = maxsize
+        # Maximum cosine distance between a query and a cached key for a hit.
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+
+        # Keys are normalized vectors stored in a preallocated matrix, and used
+        # slots are ordered from least to most recently used.
+        self._keys: np.ndarray | None = None
+        self._namespace_hashes = np.zeros(maxsize, dtype=np.int64)
+        self._valid = np.zeros(maxsize, dtype=bool)
+        self._namespaces: list[Hashable] = [None] * maxsize
+        self._values: list[T | None] = [None] * maxsize
+        self._slots: OrderedDict[int, None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get(self, vector: list[float], namespace: Hashable = None) -> T | None:
+        if self._keys is not None and self._slots:
+            similarities = self._keys @ _normalize(vector)
+            similarities[
+                ~(self._valid & (self._namespace_hashes == hash(namespace)))
+            ] = -np.inf
+            slot = int(similarities.argmax())
+            if (
+                1 - similarities[slot] <= self.tolerance
+                and self._namespaces[slot] == namespace
+            ):
+                self._slots.move_to_end(slot)
+                self.hits += 1
+                return self._values[slot]
+
+        self.misses += 1
+
+        return None
+
+    def put(self, vector: list[float], value: T, namespace: Hashable = None) -> None:
+        if self.maxsize <= 0:
+            return
+
+        key = _normalize(vector)
+        if self._keys is None:
+            self._keys = np.zeros((self.maxsize, len(key)), dtype=np.float32)
+
+        if len(self._slots) < self.maxsize:
+            slot = len(self._slots)
+        else:
+            slot, _ = self._slots.popitem(last=False)
+
+        self._keys[slot] = key
+        self._namespace_hashes[slot] = hash(namespace)
+        self._valid[slot] = True
+        self._namespaces[slot] = namespace
+        self._values[slot] = value
+        self._slots[slot] = None
+
+    def clear(self) -> None:
+        self._valid[:] = False
+        self._namespaces = [None] * self.maxsize
+        self._values = [None] * self.maxsize
+        self._slots.clear()
+
+
+def _normalize(vector: list[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+
+    return array / norm if norm else array
@@ -9,43 +9,59 @@ import structlog
 logger = structlog.get_logger()
 
 
+# Log value which is only computed if the log entry is rendered.
+class LazyValue:
+    def __init__(self, fn: Callable[..., Any], *args, **kwargs) -> None:
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __structlog__(self) -> Any:
+        return self.fn(*self.args, **self.kwargs)
+
+    def __repr__(self) -> str:
+        return repr(self.__structlog__())
+
+
 def log_time(
     *,
     task: str | None = None,
     args: list[str] | Callable[[dict], dict[str, Any]] | None = None,
 ):
     def _fn(fn):
+        log_task = task or fn.__name__
+        log_args = args or []
+        arg_names = inspect.getfullargspec(fn).args
+        default_fn_kwargs = {
+            k: v.default
+            for k, v in inspect.signature(fn).parameters.items()
+            if v.default is not v.empty
+        }
+
         @functools.wraps(fn)
         async def _wrapper(*fn_args, **fn_kwargs):
             start_time = time.time()
+            start_counter = time.perf_counter()
             response = await fn(*fn_args, **fn_kwargs)
-            end_time = time.time()
-
-            nonlocal args, task
-            if not task:
-                task = fn.__name__
-            if not args:
-                args = []
-
-            arg_names = inspect.getfullargspec(fn).args
-            fn_args = dict(zip(arg_names, fn_args, strict=False))
-            default_fn_kwargs = {
-                k: v.default
-                for k, v in inspect.signature(fn).parameters.items()
-                if v.default is not v.empty
-            }
-            all_log_args = fn_args | default_fn_kwargs | fn_kwargs
-            if callable(args):
-                log_kwargs = args(all_log_args)
+            duration = time.perf_counter() - start_counter
+            end_time = start_time + duration
+
+            all_log_args = (
+                dict(zip(arg_names, fn_args, strict=False))
+                | default_fn_kwargs
+                | fn_kwargs
+            )
+            if callable(log_args):
+                log_kwargs = log_args(all_log_args)
             else:
-                log_kwargs = {x: all_log_args[x] for x in args}
+                log_kwargs = {x: all_log_args[x] for x in log_args}
 
             logger.info(
                 "Execute time",
-                task=task,
+                task=log_task,
                 start_time=start_time,
                 end_time=end_time,
-                duration=end_time - start_time,
+                duration=duration,
                 **log_kwargs,
             )
 
@@ -1,8 +1,18 @@
 import itertools
 from collections.abc import Iterable
 
+import numpy as np
+
 
 def chunk(iterator: Iterable, size: int) -> Iterable[tuple]:
+    if hasattr(itertools, "batched"):
+        return itertools.batched(iterator, size)
+
     it = iter(iterator)
 
     return iter(lambda: tuple(itertools.islice(it, size)), ())
+
+
+def chunk_np(array: np.ndarray, size: int) -> Iterable[np.ndarray]:
+    for i in range(0, len(array), size):
+        yield array[i : i + size]
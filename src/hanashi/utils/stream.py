@@ -26,9 +26,35 @@ async def oneshot_stream(
             await asyncio.sleep(delay)
 
 
-async def merge_streams(*streams, sep: str = "\n\n") -> AsyncGenerator:
-    for stream in streams:
-        async for chunk in stream:
-            yield chunk
+# Marks the end of a stream in its queue.
+_END = object()
 
-        yield sep
+
+async def merge_streams(*streams, sep: str = "\n\n") -> AsyncGenerator:
+    queues: list[asyncio.Queue] = [asyncio.Queue() for _ in streams]
+
+    async def _pump(stream, queue: asyncio.Queue) -> None:
+        try:
+            async for chunk in stream:
+                queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(_END)
+
+    # Consume all streams concurrently, but yield them in order: the current
+    # stream is yielded as it arrives while the following ones are buffered.
+    tasks = [
+        asyncio.create_task(_pump(stream, queue))
+        for stream, queue in zip(streams, queues, strict=True)
+    ]
+    try:
+        for task, queue in zip(tasks, queues, strict=True):
+            while (chunk := await queue.get()) is not _END:
+                yield chunk
+
+            # Raise the error of the stream, if any.
+            await task
+
+            yield sep
+    finally:
+        for task in tasks:
+            task.cancel()
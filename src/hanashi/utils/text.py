@@ -1,13 +1,15 @@
+import functools
+import hashlib
 from typing import cast
 
+import numpy as np
 import tiktoken
 
+_MIN_PARALLEL_BATCH_SIZE = 256
 
-def count_approximate_tokens(
-    text: str,
-    encoding: str | None = "cl100k_base",
-    model: str | None = None,
-) -> int:
+
+@functools.lru_cache(maxsize=8)
+def _get_encoder(encoding: str | None, model: str | None) -> tiktoken.Encoding:
     if encoding is not None and model is not None:
         msg = "Only one of 'encoding' and 'model' should be provided."
         raise ValueError(msg)
@@ -17,9 +19,49 @@ def count_approximate_tokens(
         raise ValueError(msg)
 
     if encoding is not None:
-        enc = tiktoken.get_encoding(encoding)
+        return tiktoken.get_encoding(encoding)
+
+    return tiktoken.encoding_for_model(cast(str, model))
+
+
+def count_approximate_tokens(
+    text: str,
+    encoding: str | None = "cl100k_base",
+    model: str | None = None,
+) -> int:
+    return len(_get_encoder(encoding, model).encode(text))
+
+
+def count_approximate_tokens_batch(
+    texts: list[str],
+    encoding: str | None = "cl100k_base",
+    model: str | None = None,
+    num_threads: int = 8,
+) -> list[int]:
+    enc = _get_encoder(encoding, model)
+
+    # Each batch call starts a new thread pool, which only pays off for many texts.
+    num_threads = min(num_threads, len(texts))
+    if len(texts) < _MIN_PARALLEL_BATCH_SIZE or num_threads <= 1:
+        return [len(enc.encode_ordinary(x)) for x in texts]
+
+    return [len(x) for x in enc.encode_ordinary_batch(texts, num_threads=num_threads)]
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    words = text.lower().split()
+    shingles = [
+        " ".join(words[i : i + shingle_size])
+        for i in range(max(1, len(words) - shingle_size + 1))
+    ]
 
-    else:
-        enc = tiktoken.encoding_for_model(cast(str, model))
+    # Each bit of the 64-bit fingerprint is set if most shingle hashes set it.
+    hashes = np.frombuffer(
+        b"".join(
+            hashlib.blake2b(x.encode(), digest_size=8).digest() for x in shingles
+        ),
+        dtype=np.uint8,
+    ).reshape(-1, 8)
+    bit_counts = np.unpackbits(hashes, axis=1).sum(axis=0, dtype=np.int64)
 
-    return len(enc.encode(text))
+    return int.from_bytes(np.packbits(bit_counts * 2 > len(shingles)).tobytes(), "big")